@@ -2,6 +2,7 @@
 # This file implements Reinforcement Learning algorithms to solve the Markov Decision Process (MDP)
 # - Bellman's Equation U′(s) ← R(s) + γ max a∈A(s) ∑s′ P(s′|s,a) U(s′)
 # - Value Iteration (Bellman Equation, Maximum Expected Utility)
+# - Prioritized Sweeping (Value Iteration ordered by the largest pending change in utility)
 # - Policy Iteration (Policy Evaluation, Policy Improvement)
 #
 # Reference   : Chapters 16 & 17 “Artificial Intelligence: A Modern Approach” by S. Russell and
@@ -11,30 +12,39 @@
 # Created by  : Au Jit Seah
 #######################################################################################################
 """
-Implements the Value Iteration and Policy Iteration methods.
+Implements the Value Iteration, Prioritized Sweeping and Policy Iteration methods.
 
 Public methods :
 - value_iteration
+- prioritized_sweeping
 - policy_iteration
 
 Internal methods
-- _bellman_equation
-- _get_expected_utility
+- _to_results
+- _grow_history
+- _precompute_transitions
+- _get_expected_utilities
+- _precompute_predecessors
 - _policy_evaluation
 - _policy_improvement
 """
 
-from mdp import MarkovDecisionProcess
-from maze import MazeAction
+import numpy as np
 
+from maze import Maze, MazeAction
+from mdp_kernels import UTILITY_DTYPE, make_kernels
+
+
+# Number of iterations the utility history is first allocated for, doubled whenever it is full
+_INITIAL_HISTORY_ROWS = 64
 
 # Reference: Figure 17.4 of “Artificial Intelligence: A Modern Approach”
-# MarkovDecisionProcess implements transition_model, reward_function and get_next_states
+# Maze provides P(s′|s, a) and R(s) as arrays, see _precompute_transitions
 # Value Iteration algorithm
-def value_iteration(mdp: MarkovDecisionProcess, max_error: float = 1.0, verbose: bool = False):
+def value_iteration(mdp: Maze, max_error: float = 1.0, verbose: bool = False):
     """
     params:
-    - mdp (MarkovDecisionProcess): an MDP with 
+    - mdp (Maze): an MDP with 
         - possible states, S
         - possible actions, A(s)
         - transition model, P(s′|s, a)
@@ -57,49 +67,43 @@ def value_iteration(mdp: MarkovDecisionProcess, max_error: float = 1.0, verbose:
         }
     }
     """
-    # U, U′, vectors of utilities for states in S, are initially zero
-    current_utilities, new_utilities, optimal_policy = {}, {}, {}
+    next_states, probabilities, rewards, state_index, action_list = _precompute_transitions(mdp)
+    bellman_backup, _, _ = make_kernels(len(probabilities), probabilities.shape[2])
+
+    # Only the cells that are states are swept; walls keep their utility of zero
+    active_states = np.fromiter(state_index.values(), dtype=np.int32)
+
+    # γ and the termination threshold ϵ(1−γ)/γ are constant for the whole solve
+    discount = UTILITY_DTYPE(mdp.discount)
+    max_change_allowed = UTILITY_DTYPE(max_error * (1 - mdp.discount) / mdp.discount)
 
     # Use for plotting the Utility estimates as a function of the number of iterations
     # Reference: Figure 17.5 of “Artificial Intelligence: A Modern Approach”
-    iteration_utilities = {}
-
-    # For all states in S, initialise U and U′ vectors of utilities to zero
-    # For all states, initialise actions to None
-    for state_position in mdp.states:
-        current_utilities[state_position] = 0
-        new_utilities[state_position] = 0
-        optimal_policy[state_position] = None
+    # Row i holds U of iteration i and row i + 1 receives its U′
+    iteration_utilities = np.empty((_INITIAL_HISTORY_ROWS, len(rewards)), dtype=UTILITY_DTYPE)
 
-        # start with empty list since it is updated at start of iteration
-        iteration_utilities[state_position] = []
+    # U, U′, vectors of utilities for states in S, are initially zero
+    iteration_utilities[0] = 0
+    # Buffers reused by every sweep : the best action of each state and the expected utility of each action
+    policy_indices = np.zeros(len(rewards), dtype=np.int8)
+    expected_utilities = np.empty(len(action_list), dtype=UTILITY_DTYPE)
 
     converged = False
     num_iterations = 0
 
     while not converged:
-        for state_position in mdp.states:
-            # For all states in S, perform U ← U′
-            current_utilities[state_position] = new_utilities[state_position]
-            iteration_utilities[state_position].append(current_utilities[state_position])
-
-        max_utility_change = 0  # δ ← 0
+        iteration_utilities = _grow_history(iteration_utilities, num_iterations + 2)
 
-        # for each state s in S do 
-        for state_position in mdp.states:
-            # U′[s] ← R(s) + γ max a∈A(s) ∑s′ P(s′|s, a)U[s′]
-            new_utility, new_action = _bellman_equation(mdp,
-                                                        state_position,
-                                                        current_utilities)
+        # For all states in S, perform U ← U′
+        current_utilities = iteration_utilities[num_iterations]
+        new_utilities = iteration_utilities[num_iterations + 1]
+        new_utilities[:] = current_utilities
 
-            new_utilities[state_position] = new_utility
-            optimal_policy[state_position] = new_action
-
-            # if |U′[s]−U[s]| > δ then δ ← |U′[s]−U[s]|
-            abs_utility_difference = abs(new_utilities[state_position] - current_utilities[state_position])
-
-            if abs_utility_difference > max_utility_change:
-                max_utility_change = abs_utility_difference
+        # U′[s] ← R(s) + γ max a∈A(s) ∑s′ P(s′|s, a)U′[s′], for each state s in S, updated in place
+        # δ ← max |U′[s]−U[s]| over all states
+        max_utility_change = bellman_backup(next_states, probabilities,
+                                            rewards, new_utilities, discount, active_states,
+                                            policy_indices, expected_utilities)
 
         num_iterations += 1
 
@@ -111,111 +115,252 @@ def value_iteration(mdp: MarkovDecisionProcess, max_error: float = 1.0, verbose:
             )
 
         # Repeat until δ < ϵ(1−γ)/γ
-        converged = max_utility_change < (max_error * (1 - mdp.discount) / mdp.discount)
+        converged = max_utility_change < max_change_allowed
 
     # Actual algorithm returns U vector utilities
     #
     # Adaptation :
     # Besides U, the optimal policy, number of iterations and iteration utilities are returned for plotting
+    return _to_results(state_index, action_list, current_utilities, policy_indices, num_iterations,
+                       iteration_utilities[:num_iterations])
+
+
+def _to_results(state_index: dict, action_list: list, utilities: np.ndarray, policy_indices: np.ndarray,
+                num_iterations: int, iteration_utilities: np.ndarray) -> dict:
+    """
+    Map the results of a solve from state indices back to (row, col) positions, which is only done here
+
+    params:
+    - state_index (dict): { (row, col): index of the state in the arrays }
+    - action_list (list): action for each action index (MazeAction)
+    - utilities (np.ndarray): utility value of each state
+    - policy_indices (np.ndarray): index of the best action to take at each state
+    - num_iterations (int): number of iterations reported for the solve
+    - iteration_utilities (np.ndarray): utility of each state (column) for each recorded iteration (row)
+
+    return:
+    the results in the format returned by value_iteration, prioritized_sweeping and policy_iteration (dict)
+    """
     return {
-        'utilities': current_utilities,
-        'optimal_policy': optimal_policy,
+        'utilities': {
+            state_position: float(utilities[i]) for state_position, i in state_index.items()
+        },
+        'optimal_policy': {
+            state_position: action_list[policy_indices[i]] for state_position, i in state_index.items()
+        },
         'num_iterations': num_iterations,
-        'iteration_utilities': iteration_utilities,
+        'iteration_utilities': {
+            state_position: iteration_utilities[:, i].tolist() for state_position, i in state_index.items()
+        },
     }
 
 
-def _bellman_equation(mdp: MarkovDecisionProcess, state_position: tuple, current_utilities: dict):
+def _grow_history(iteration_utilities: np.ndarray, num_rows: int) -> np.ndarray:
+    """
+    Make sure the utility history can hold the given number of rows, doubling its size when it is full
+
+    params:
+    - iteration_utilities (np.ndarray): utility of each state (column) for each iteration (row)
+    - num_rows (int): number of rows required
+
+    return:
+    the same array if it is large enough, or a larger copy of it (np.ndarray)
+    """
+    if num_rows <= len(iteration_utilities):
+        return iteration_utilities
+
+    grown = np.zeros((max(num_rows, 2 * len(iteration_utilities)), iteration_utilities.shape[1]),
+                     dtype=iteration_utilities.dtype)
+    grown[:len(iteration_utilities)] = iteration_utilities
+    return grown
+
+
+def _precompute_transitions(mdp: Maze):
     """
-    Implementation of U′[s] ← R(s) + γ max a∈A(s) ∑s′P(s′|s, a)U[s′]
+    Take P(s′|s, a) and R(s) of the maze as arrays, so that the expected utilities of every state and
+    action can be computed without walking the dictionaries of the MDP
+
+    The arrays are attributes of Maze rather than of MarkovDecisionProcess, so the solvers need a Maze.
+    The dictionary API of MarkovDecisionProcess (transition_model, reward_function and get_next_states)
+    is not used by the solvers, and is kept only for external callers.
+
+    Each state and action has the same number of next states (3 in the maze: the intended move and the
+    two moves at right angles), so P(s′|s, a) is stored as fixed-size (|A|, |S|, K) arrays.
+
+    States are indexed by their cell in the grid, row·width + col, so the index of any (row, col) is
+    computed rather than looked up.  Cells that are not states (walls) get a reward of zero and stay
+    where they are under every action, so their utility remains zero and they are never reached.
 
     params:
-    - mdp (MarkovDecisionProcess): the defined MDP task with initialised data structure
-    - state_position (tuple): row, col
-    - current_utilities (dict): maps any (row, col) state to its current utility value
+    - mdp (Maze): the defined MDP task with its transitions and rewards as arrays
 
     return:
     (
-        updated utility value of the provided state (float),
-        best action to take at the provided state (MazeAction)
+        index of each next state s′, for each action, state and successor (np.ndarray),
+        P(s′|s, a) of each next state s′, for each action, state and successor (np.ndarray),
+        R(s) for each cell (np.ndarray),
+        { (row, col): index of the state in the arrays, row·width + col (int) },
+        [action for each action index (MazeAction)]
     )
     """
-    # Initialise with an infinitely large negative Maximum Expected Utility value and None best action
-    max_expected_utility = float('-inf')
-    best_action = None
-
-    state_with_action = mdp.states[state_position]
-
-    # MazeAction.MOVE_UP, MOVE_DOWN, MOVE_LEFT, MOVE_RIGHT
-    for action in state_with_action:
-        # get the expected utility of each available actions
-        expected_utility = _get_expected_utility(mdp,
-                                                 state_position,
-                                                 action,
-                                                 current_utilities)
-
-        # Get the maximum Expected Utility with the best action for the state
-        if expected_utility > max_expected_utility:
-            max_expected_utility = expected_utility
-            best_action = action
-
-    # returns computed U′[s] with 2 parts, Reward and discounted Max Expected Utility
-    return (mdp.reward_function(state_position) + mdp.discount * max_expected_utility,
-            best_action)
-
-
-def _get_expected_utility(mdp: MarkovDecisionProcess,
-                          state_position: tuple,
-                          action: MazeAction,
-                          current_utilities: dict
-                          ) -> float:
+    state_index = mdp.state_ids
+    action_list = list(mdp.actions)
+
+    # Built by the maze in the same cell order, with the actions in the order of mdp.actions
+    # The rewards of the maze are exact (float64), the solvers work in single precision
+    rewards = mdp.rewards.astype(UTILITY_DTYPE, copy=False)
+    next_states = mdp.next_state_indices
+    probabilities = mdp.transition_probabilities.astype(UTILITY_DTYPE, copy=False)
+
+    return next_states, probabilities, rewards, state_index, action_list
+
+
+def _get_expected_utilities(next_states: np.ndarray, probabilities: np.ndarray, utilities: np.ndarray) -> np.ndarray:
     """
-    Implementation of ∑s′ P(s′|s, a)U[s′]
+    Implementation of ∑s′ P(s′|s, a)U[s′] for every state and action
 
     params:
-    - mdp (MarkovDecisionProcess): the defined MDP task with initialised data structure
-    - state_position (tuple): row, col
-    - action (MazeAction): action to take at the provided state
-    - current_utilities:
-    {
-        (row, col): current utility value of state (float)
-    }
+    - next_states (np.ndarray): index of each next state s′, for each action, state and successor
+    - probabilities (np.ndarray): P(s′|s, a) of each next state s′, for each action, state and successor
+    - utilities (np.ndarray): current utility value of each state
 
     return:
-    Expected Utility value of the provided state (float)
+    Expected Utility value of each state (row) for each action (column) (np.ndarray)
     """
-    expected_utility = 0
+    return (probabilities * utilities[next_states]).sum(axis=2).T
 
-    # <MazeAction.MOVE_DOWN: 2>:
-    #  {(4, 2): {'actual': (4, 2), 'probability': 0.1},
-    #   (4, 4): {'actual': (4, 4), 'probability': 0.1},
-    #   (5, 3): {'actual': (5, 3), 'probability': 0.8}}
-    possible_next_states = mdp.get_next_states(state_position, action)
 
-    for intended_next_state_position in possible_next_states:
-        probability = mdp.transition_model(state_position,
-                                           action,
-                                           intended_next_state_position)
+# Reference: Section 8.4 of “Reinforcement Learning: An Introduction” by R. S. Sutton and A. G. Barto
+# Maze provides P(s′|s, a) and R(s) as arrays, see _precompute_transitions
+# Prioritized Sweeping algorithm
+def prioritized_sweeping(mdp: Maze, max_error: float = 1.0, verbose: bool = False):
+    """
+    Value Iteration that only updates the state with the largest pending change in utility, instead
+    of sweeping all the states in every iteration
 
-        # actual state used to calculate utility, adjusted for invalid state (out of grid or going into wall)
-        actual_next_state_position = possible_next_states[intended_next_state_position]['actual']
+    params:
+    - mdp (Maze): an MDP with
+        - possible states, S
+        - possible actions, A(s)
+        - transition model, P(s′|s, a)
+        - reward for state, R(s)
+        - discount factor, γ
+    - max_error (float): the maximum error, ε, allowed in the utility of any state
+    - verbose (bool): True to print debugging information
 
-        # obtain next state utility from current utilities of all possible states
-        next_state_utility = current_utilities[actual_next_state_position]
+    return:
+    {
+        'utilities': {
+            (row, col): utility value (float)
+        },
+        'optimal_policy': {
+            (row, col): best action to take at this state (MazeAction)
+        },
+        'num_iterations': number of state updates divided by |S|, rounded up (int),
+        'iteration_utilities': {
+            (row, col): [utility at the start and after every |S| state updates (float)]
+        }
+    }
+    """
+    next_states, probabilities, rewards, state_index, action_list = _precompute_transitions(mdp)
+    _, _, prioritized_sweep = make_kernels(len(probabilities), probabilities.shape[2])
+    num_states = len(state_index)
+    num_cells = len(rewards)
+
+    # γ and the termination threshold ϵ(1−γ)/γ are constant for the whole solve
+    discount = UTILITY_DTYPE(mdp.discount)
+    max_change_allowed = UTILITY_DTYPE(max_error * (1 - mdp.discount) / mdp.discount)
+
+    # Reverse graph : the states whose utility depends on U[s′], for each state s′
+    predecessor_offsets, predecessors = _precompute_predecessors(next_states, probabilities)
+
+    # U, vector of utilities for states in S, is initially zero
+    utilities = np.zeros(num_cells, dtype=UTILITY_DTYPE)
+
+    # Priority of a state is its pending change in utility, |U′[s]−U[s]|, which is R(s) while U is zero
+    # The states sorted by decreasing priority (smaller index first on ties) already form a valid max-heap
+    priorities = np.abs(rewards)
+    active_states = np.fromiter(state_index.values(), dtype=np.int32)
+    heap = active_states[np.lexsort((active_states, -priorities[active_states]))]
+    heap_positions = np.full(num_cells, -1, dtype=np.int32)
+    heap_positions[heap] = np.arange(num_states, dtype=np.int32)
+    expected_utilities = np.empty(len(action_list), dtype=UTILITY_DTYPE)
+
+    # Use for plotting the Utility estimates as a function of the number of iterations
+    # Reference: Figure 17.5 of “Artificial Intelligence: A Modern Approach”
+    iteration_utilities = np.empty((_INITIAL_HISTORY_ROWS, num_cells), dtype=UTILITY_DTYPE)
+    iteration_utilities[0] = utilities
+    num_iterations = 0
+    num_updates = 0
+
+    # The kernel returns after every |S| state updates to record U, and with fewer once δ < ϵ(1−γ)/γ
+    # A maze without states (all walls) has nothing to update, and would otherwise never return fewer
+    while num_states > 0:
+        num_new_updates = prioritized_sweep(next_states, probabilities, rewards, utilities, discount,
+                                            predecessor_offsets, predecessors, priorities, heap, heap_positions,
+                                            max_change_allowed, num_states, expected_utilities)
+        num_updates += num_new_updates
+
+        if num_new_updates < num_states:
+            break
+
+        num_iterations += 1
+        iteration_utilities = _grow_history(iteration_utilities, num_iterations + 1)
+        iteration_utilities[num_iterations] = utilities
+
+        if verbose:
+            print(
+                'iteration:', num_iterations,
+                ' with largest pending change in the utility of any state:',
+                '{:.4f}'.format(priorities.max()),
+            )
+
+    # Record the utilities after the last, partial, iteration (a single one without states, as Value Iteration)
+    if num_states == 0 or num_updates % num_states != 0:
+        num_iterations += 1
+        iteration_utilities = _grow_history(iteration_utilities, num_iterations + 1)
+        iteration_utilities[num_iterations] = utilities
 
-        # ∑s′ P(s′|s, a)U[s′] with action, a
-        expected_utility += probability * next_state_utility
+    # Best action to take at each state, with the converged utilities
+    policy_indices = _get_expected_utilities(next_states, probabilities, utilities).argmax(axis=1)
 
-    return expected_utility
+    return _to_results(state_index, action_list, utilities, policy_indices, num_iterations,
+                       iteration_utilities[:num_iterations + 1])
+
+
+def _precompute_predecessors(next_states: np.ndarray, probabilities: np.ndarray):
+    """
+    params:
+    - next_states (np.ndarray): index of each next state s′, for each action, state and successor
+    - probabilities (np.ndarray): P(s′|s, a) of each next state s′, for each action, state and successor
+
+    return:
+    (
+        offsets of the predecessors of each state s′, and their total at the end (np.ndarray),
+        indices of the states s with P(s′|s, a) > 0 for any action a, grouped by s′ (np.ndarray)
+    )
+    """
+    num_states = next_states.shape[1]
+
+    # (s′, s) pairs of every possible transition, sorted and without duplicates, each as the single
+    # integer s′·|S| + s so that they are sorted as a flat array rather than as rows
+    reachable = probabilities > 0
+    _, sources, _ = np.nonzero(reachable)
+    edges = np.unique(next_states[reachable].astype(np.int64) * num_states + sources)
+    targets, sources = np.divmod(edges, num_states)
+
+    # The sources of each s′ start where s′ first appears, so that the predecessors are stored back to back
+    offsets = np.searchsorted(targets, np.arange(num_states + 1))
+    return offsets, sources.astype(np.int32)
 
 
 # Reference: Figure 17.7 of “Artificial Intelligence: A Modern Approach”
-# MarkovDecisionProcess implements transition_model, reward_function and get_next_states
+# Maze provides P(s′|s, a) and R(s) as arrays, see _precompute_transitions
 # Policy Iteration algorithm
-def policy_iteration(mdp: MarkovDecisionProcess, num_policy_evaluation: int = 1, verbose: bool = False):
+def policy_iteration(mdp: Maze, num_policy_evaluation: int = 1, verbose: bool = False):
     """
     params:
-    - mdp (MarkovDecisionProcess): an MDP with
+    - mdp (Maze): an MDP with
         - possible states, S
         - possible actions, A(s)
         - transition model, P(s′|s, a)
@@ -239,23 +384,23 @@ def policy_iteration(mdp: MarkovDecisionProcess, num_policy_evaluation: int = 1,
         }
     }
     """
-    # U, vector of utilities for all states in S
-    # π, policy vector for all states in S
-    utilities, policy = {}, {}
+    next_states, probabilities, rewards, state_index, action_list = _precompute_transitions(mdp)
 
-    # Use for plotting the Utility estimates as a function of the number of iterations
-    # Reference: Figure 17.5 of “Artificial Intelligence: A Modern Approach”
-    iteration_utilities = {}
+    # Only the cells that are states are evaluated; walls keep their utility of zero
+    active_states = np.fromiter(state_index.values(), dtype=np.int32)
 
-    # For all states in S, initialise U, a vector of utilities to zero
-    # For all states, initialise π, a policy vector of a state, initially "Move Up" (or random)
-    for state_position in mdp.states:
-        utilities[state_position] = 0
-        policy[state_position] = MazeAction.MOVE_UP
+    # U, vector of utilities for all states in S, initially zero
+    # π, policy vector of action indices for all states in S, initially "Move Up" (or random)
+    utilities = np.zeros(len(rewards), dtype=UTILITY_DTYPE)
+    policy = np.full(len(rewards), action_list.index(MazeAction.MOVE_UP), dtype=np.int8)
 
-        # ** could start with iteration_utilities[state_position] = [] **
-        # start with first utility in place since it is updated at end of iteration
-        iteration_utilities[state_position] = [0]
+    # Use for plotting the Utility estimates as a function of the number of iterations
+    # Reference: Figure 17.5 of “Artificial Intelligence: A Modern Approach”
+    # start with first utility in place since it is updated at end of iteration
+    # Rows start at zero, which walls keep as they are never evaluated
+    iteration_utilities = np.zeros((_INITIAL_HISTORY_ROWS, len(rewards)), dtype=UTILITY_DTYPE)
+    iteration_utilities[0] = utilities
+    num_history_rows = 1
 
     # Keep track if policy for all states in S become unchanged after Policy Improvement
     unchanged = False
@@ -264,14 +409,20 @@ def policy_iteration(mdp: MarkovDecisionProcess, num_policy_evaluation: int = 1,
 
     while not unchanged:
         # U ← POLICY-EVALUATION (π, U, mdp)
-        # U_i+1(s) ← R(s) + γ ∑s′ P(s'|s, π_i(s)) U_i(s')
-        utilities, new_iteration_utilities = _policy_evaluation(mdp,
-                                                                policy,
-                                                                utilities,
-                                                                num_policy_evaluation)
+        # U_i+1(s) ← R(s) + γ ∑s′ P(s'|s, π_i(s)) U_i(s'), recorded straight into the next k rows
+        iteration_utilities = _grow_history(iteration_utilities, num_history_rows + num_policy_evaluation)
+        utilities = _policy_evaluation(next_states,
+                                       probabilities,
+                                       rewards,
+                                       UTILITY_DTYPE(mdp.discount),
+                                       active_states,
+                                       policy,
+                                       utilities,
+                                       iteration_utilities[num_history_rows:num_history_rows + num_policy_evaluation])
+        num_history_rows += num_policy_evaluation
 
         # POLICY-IMPROVEMENT : π′(s) ← max a∈A(s) ∑s′ P(s′|s, a) Uπ(s′)
-        policy, unchanged = _policy_improvement(mdp, policy, utilities)
+        policy, unchanged = _policy_improvement(next_states, probabilities, policy, utilities)
 
         num_iterations += num_policy_evaluation
         policy_iterations += 1
@@ -281,13 +432,8 @@ def policy_iteration(mdp: MarkovDecisionProcess, num_policy_evaluation: int = 1,
 
         if verbose:
             print('iteration:', num_iterations)
-
-        for state_position in mdp.states:
-            # extends list by appending elements from the iterable (ie. each element of the iterable gets appended onto the list)
-            iteration_utilities[state_position].extend(new_iteration_utilities[state_position])
-
-            if verbose:
-                print('at', state_position, '-best action:', policy[state_position])
+            for state_position, i in state_index.items():
+                print('at', state_position, '-best action:', action_list[policy[i]])
 
         # Repeat until policy for all states in S become unchanged
 
@@ -295,52 +441,43 @@ def policy_iteration(mdp: MarkovDecisionProcess, num_policy_evaluation: int = 1,
     #
     # Adaptation :
     # Besides the optimal policy π, current utilities, number of iterations and iteration utilities are returned for plotting
-    return {
-        'utilities': utilities,
-        'optimal_policy': policy,
-        'num_iterations': policy_iterations, # num_iterations
-        'iteration_utilities': iteration_utilities,
-    }
+    return _to_results(state_index, action_list, utilities, policy, policy_iterations,  # num_iterations
+                       iteration_utilities[:num_history_rows])
 
 # Step 1 of Policy Iteration algorithm : Policy Evaluation
-def _policy_evaluation(mdp: MarkovDecisionProcess,
-                       policy: dict,
-                       utilities: dict,
-                       num_policy_evaluation: int):
+def _policy_evaluation(next_states: np.ndarray,
+                       probabilities: np.ndarray,
+                       rewards: np.ndarray,
+                       discount: float,
+                       active_states: np.ndarray,
+                       policy: np.ndarray,
+                       utilities: np.ndarray,
+                       new_iteration_utilities: np.ndarray):
     """
     Simplified version of Bellman equation with fixed policy or action for a number of iterations
 
     params:
-    - mdp (MarkovDecisionProcess): an MDP with 
-        - possible states, S
-        - possible actions, A(s)
-        - transition model, P(s′|s, a)
-        - reward for state, R(s)
-        - discount factor, γ
-    - policy: {
-        (row, col): best action to take at this state (MazeAction)
-    }
-    - utilities: {
-        (row, col): utility value (float)
-    }
-    - num_policy_evaluation (int): number of times to do policy evaluation (k) to obtain
-                                   better estimates for the utilities, U_i+1(s) with default value of 1
+    - next_states (np.ndarray): index of each next state s′, for each action, state and successor
+    - probabilities (np.ndarray): P(s′|s, a) of each next state s′, for each action, state and successor
+    - rewards (np.ndarray): reward for each state, R(s)
+    - discount (float): discount factor, γ
+    - active_states (np.ndarray): indices of the states to evaluate
+    - policy (np.ndarray): index of the best action to take at each state
+    - utilities (np.ndarray): utility value of each state
+    - new_iteration_utilities (np.ndarray): output for the utility of each state (column) for each value
+                                            iteration (row), with one row for each of the number of times
+                                            to do policy evaluation (k)
 
     return:
-    (
-        { (row, col): updated current utility value (float) },
-        { (row, col: [utility for each value iteration (float)] }
-    )
+    updated current utility value of each state (np.ndarray)
     """
-    current_utilities, updated_utilities = {}, {}
-    new_iteration_utilities = {}
+    _, policy_backup, _ = make_kernels(len(probabilities), probabilities.shape[2])
 
-    # For all states in S, initialise U vectors of utilities to current values of utilities
-    for state_position in mdp.states:
-        # U_i ← U
-        current_utilities[state_position] = utilities[state_position]
-        new_iteration_utilities[state_position] = []
+    # U_i ← U
+    current_utilities = utilities
 
+    # Each round writes its U_i+1 straight into its own row, which is then read as U_i by the next round
+    num_policy_evaluation = len(new_iteration_utilities)
 
     # Iterate to get state utilities for specified "num_policy_evaluation" of rounds (ie. k times)
     # Modified Policy Iteration
@@ -349,98 +486,53 @@ def _policy_evaluation(mdp: MarkovDecisionProcess,
     # - these utility estimates give reasonably good approximation of the utilities.
     # - π_i+1(s) ← max a∈A(s) ∑s′ P(s′|s, a) U_i+k_π_i(s′)
     for eval_num in range(num_policy_evaluation):
-
-        # print("\nWithin Policy Evaluation iteration no. :", eval_num + 1)
-        # for each state s in S do
-        for state_position in mdp.states:
-            # Get the reward for each state
-            reward = mdp.reward_function(state_position)
-
-            # ∑s′P (s'|s, π_i(s)) Uπ_i(s')
-            expected_utility = _get_expected_utility(mdp,
-                                                     state_position,
-                                                     policy[state_position], # action to be taken
-                                                     current_utilities)
-
-            # U_i+1(s) ← R(s) + γ ∑s′ P(s'|s, π_i(s)) U_i(s')
-            updated_utilities[state_position] = reward + mdp.discount * expected_utility
-
-        # In Policy Evaluation, adapt to use Policy Iteration to improve estimated state utilities that are
-        # used in Policy Improvement
+        # U_i+1(s) ← R(s) + γ ∑s′ P(s'|s, π_i(s)) U_i(s') for each state s in S
         # Only updates the current utilities after getting Expected Utility for each state so that the neighbouring
         # utilities are not changed prematurely in the computation for next round
-        # U_i ← U_i+1
-        for state_position in mdp.states:
-            current_utilities[state_position] = updated_utilities[state_position]
-            new_iteration_utilities[state_position].append(current_utilities[state_position])
+        policy_backup(next_states, probabilities,
+                      rewards, current_utilities, discount, active_states, policy,
+                      new_iteration_utilities[eval_num])
 
-            # if (((eval_num + 1) % 2) == 0):
-            #     print("state : {}; new_iteration_utilities : {}".format(state_position,
-            #                                                             new_iteration_utilities[state_position]))
+        # U_i ← U_i+1, without copying
+        current_utilities = new_iteration_utilities[eval_num]
 
     # return the better estimated utilities after "num_policy_evaluation" rounds of iteration
-    return current_utilities, new_iteration_utilities
+    return current_utilities
 
 
 # Step 2 of Policy Iteration algorithm : Policy Improvement
-def _policy_improvement(mdp,
-                        policy,
-                        utilities):
+def _policy_improvement(next_states: np.ndarray,
+                        probabilities: np.ndarray,
+                        policy: np.ndarray,
+                        utilities: np.ndarray):
     """
     params:
-    - mdp (MarkovDecisionProcess): an MDP with
-        - possible states, S
-        - possible actions, A(s)
-        - transition model, P(s′|s, a)
-        - reward for state, R(s)
-        - discount factor, γ
-    - policy: {
-        (row, col): best action to take at this state (MazeAction)
-    }
-    - utilities: {
-        (row, col): utility value (float)
-    }
+    - next_states (np.ndarray): index of each next state s′, for each action, state and successor
+    - probabilities (np.ndarray): P(s′|s, a) of each next state s′, for each action, state and successor
+    - policy (np.ndarray): index of the best action to take at each state
+    - utilities (np.ndarray): utility value of each state
 
     return:
     (
-        updated_policy (dict),
+        policy, updated in place (np.ndarray),
         unchanged (bool),
     )
     """
-    updated_policy = {}
-    unchanged = True  # unchanged? ← true
-
-    # for each state s in S do
-    for state_position in mdp.states:
-        # get max a∈A(s) ∑s′ P(s'|s, a) U(s')
-        max_expected_utility = float('-inf')
-        best_action = None
-
-        state_with_action = mdp.states[state_position]
-
-        for action in state_with_action:
-            # ∑s′P (s'|s, π_i(s)) Uπ_i(s')
-            expected_utility = _get_expected_utility(mdp,
-                                                     state_position,
-                                                     action,
-                                                     utilities)
-
-            # Modified (right-indentation) to get the best action with the Max Expected Utility
-            if expected_utility > max_expected_utility:
-                max_expected_utility = expected_utility
-                best_action = action
-
-        # Obtain the expected utility with policy π(s), ∑s′ P(s'|s, π(s))U(s')
-        policy_expected_utility = _get_expected_utility(mdp,
-                                                        state_position,
-                                                        policy[state_position],
-                                                        utilities)
-
-        # if max a∈A(s) ∑s′ P(s'|s, a) U_π_i(s') > ∑s′ P(s'|s, π[s]) U(s') then update the best policy, π_i+1(s)
-        if max_expected_utility > policy_expected_utility:
-            updated_policy[state_position] = best_action
-            unchanged = False
-        else:
-            updated_policy[state_position] = policy[state_position]
-
-    return updated_policy, unchanged
+    # ∑s′P (s'|s, a) U(s') for every state and action
+    expected_utilities = _get_expected_utilities(next_states, probabilities, utilities)
+
+    # max a∈A(s) ∑s′ P(s'|s, a) U(s') for all states at once, the first best action on ties
+    best_actions = expected_utilities.argmax(axis=1)
+    state_indices = np.arange(len(policy))
+    max_expected_utilities = expected_utilities[state_indices, best_actions]
+
+    # Obtain the expected utility with policy π(s), ∑s′ P(s'|s, π(s))U(s')
+    policy_expected_utilities = expected_utilities[state_indices, policy]
+
+    # if max a∈A(s) ∑s′ P(s'|s, a) U_π_i(s') > ∑s′ P(s'|s, π[s]) U(s') then update the best policy, π_i+1(s)
+    # Only a strict improvement changes π(s), so actions tied with π(s) cannot make the policy oscillate
+    improved = max_expected_utilities > policy_expected_utilities
+    np.copyto(policy, best_actions, casting='same_kind', where=improved)
+    unchanged = not improved.any()  # unchanged? ← true if no state improved
+
+    return policy, unchanged
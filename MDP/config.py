@@ -29,10 +29,10 @@ REWARD_MAPPING = {
 
 # Mapping of MazeAction to unicode directions for visualisation
 DIRECTION = {
-    1 : '\u2191',  # MazeAction.MOVE_UP.value = 1 (↑ : \U+2191)
-    2 : '\u2193',  # MazeAction.MOVE_DOWN.value = 2 (↓ : \U+2193)
-    3 : '\u2190',  # MazeAction.MOVE_LEFT.value = 3 (← : \U+2190)
-    4 : '\u2192',  # MazeAction.MOVE_RIGHT.value = 4 (→ : \U+2192)
+    0 : '\u2191',  # MazeAction.MOVE_UP.value = 0 (↑ : \U+2191)
+    1 : '\u2193',  # MazeAction.MOVE_DOWN.value = 1 (↓ : \U+2193)
+    2 : '\u2190',  # MazeAction.MOVE_LEFT.value = 2 (← : \U+2190)
+    3 : '\u2192',  # MazeAction.MOVE_RIGHT.value = 3 (→ : \U+2192)
 }
 
 # Start agent at 4th row, 3rd column
@@ -42,12 +42,13 @@ STARTING_POINT = { 'row': 3, 'col': 2 }
 MDP_ALGORITHM = {
     'VI': 1, # Value Iteration
     'PI': 2, # Policy Iteration
+    'PS': 3, # Prioritized Sweeping
 }
 
 # Discount factor for future state in Bellman's equation, γ
 DISCOUNT_FACTOR = 0.99
 
-# For Value Iteration :
+# For Value Iteration and Prioritized Sweeping :
 # Maximum error allowed in the utility of any state, ε
 MAX_ERROR = 78 # 10, C1:80, C2:77, C3:25
 
@@ -14,12 +14,27 @@
 Create random states and generate maze environment based on provided parameters
 
 Implements methods :
+- _to_sorted_states
 - _random_states
 - random_maze
 """
 
 import random
 
+import numpy as np
+
+
+def _to_sorted_states(flat_indices: list, maze_width: int):
+    """
+    params:
+    - flat_indices (list): cells of the maze as flat indices, row * maze_width + col
+    - maze_width (int): the width of the squared maze
+
+    return:
+    a sorted list of the [row, col] states of the cells (list)
+    """
+    return sorted([list(divmod(idx, maze_width)) for idx in flat_indices])
+
 
 def _random_states(num_g_states: int = 1,
                    num_b_states: int = 1,
@@ -41,54 +56,15 @@ def _random_states(num_g_states: int = 1,
         a sorted list of randomly generated wall states (list)
     )
     """
-    # Initialise all states
-    states_g = []
-    states_b = []
-    states_w = []
-
-    for i in range(num_g_states):
-        # Using random function to generate state position
-        g_row = random.randint(0, maze_width - 1)
-        g_col = random.randint(0, maze_width - 1)
-
-        # Generate another state that already exists in 'g' states
-        while [g_row, g_col] in states_g:
-            g_row = random.randint(0, maze_width - 1)
-            g_col = random.randint(0, maze_width - 1)
-
-        states_g.append([g_row, g_col])
-        # print("g_row : {}, g_col : {}".format(g_row, g_col))
-
-    for i in range(num_b_states):
-        # Using random function to generate state position
-        b_row = random.randint(0, maze_width - 1)
-        b_col = random.randint(0, maze_width - 1)
-
-        # Generate another state that already exists in 'g' or 'b' states 
-        while [b_row, b_col] in states_g or [b_row, b_col] in states_b:
-            b_row = random.randint(0, maze_width - 1)
-            b_col = random.randint(0, maze_width - 1)
-
-        states_b.append([b_row, b_col])
-        # print("b_row : {}, b_col : {}".format(b_row, b_col))
-
-    for i in range(num_w_states):
-        # Using random function to generate state position
-        w_row = random.randint(0, maze_width - 1)
-        w_col = random.randint(0, maze_width - 1)
-
-        # Generate another state that already exists in 'g', 'b' or 'w' states
-        while [w_row, w_col] in states_g or [w_row, w_col] in states_b or [w_row, w_col] in states_w:
-            w_row = random.randint(0, maze_width - 1)
-            w_col = random.randint(0, maze_width - 1)
-
-        states_w.append([w_row, w_col])
-        # print("w_row : {}, w_col : {}".format(w_row, w_col))
-
-    # sort() changes the original list
-    states_g.sort()
-    states_b.sort()
-    states_w.sort()
+    # Draw all the distinct cells at once, without replacement, as flat indices (row * maze_width + col)
+    # and partition them into the green, brown and wall states
+    total = num_g_states + num_b_states + num_w_states
+    # random.sample picks only the cells it needs, without shuffling the whole maze
+    flat = random.sample(range(maze_width * maze_width), total)
+
+    states_g = _to_sorted_states(flat[:num_g_states], maze_width)
+    states_b = _to_sorted_states(flat[num_g_states:num_g_states + num_b_states], maze_width)
+    states_w = _to_sorted_states(flat[num_g_states + num_b_states:], maze_width)
 
     return states_g, states_b, states_w
 
@@ -111,7 +87,7 @@ def random_maze(num_g_states: int = 1, num_b_states: int = 1, num_w_states: int
         print("The maze must have at least one green, one brown and one wall state!")
         return []
 
-    if (num_g_states + num_b_states + num_w_states) >= pow(maze_width, 2):
+    if (num_g_states + num_b_states + num_w_states) >= maze_width * maze_width:
         print("The maze dimensions must be larger than sum of all the green, brown and wall states!")
         return []
 
@@ -122,37 +98,14 @@ def random_maze(num_g_states: int = 1, num_b_states: int = 1, num_w_states: int
     print("Sorted {} Brown states : {}".format(len(states_b), states_b))
     print("Sorted {} Wall states : {}".format(len(states_w), states_w))
 
-    maze = []
     maze_height = maze_width  # Squared maze
 
-    cur_state_g_idx = 0
-    cur_state_b_idx = 0
-    cur_state_w_idx = 0
-
-    for row in range(maze_height):
-        maze.append([])
-
-        for col in range(maze_width):
-            cur_state_g = states_g[cur_state_g_idx]
-            cur_state_b = states_b[cur_state_b_idx]
-            cur_state_w = states_w[cur_state_w_idx]
-
-            if row == cur_state_g[0] and col == cur_state_g[1]:
-                # print("Current state_g index :", cur_state_g_idx)
-                maze[row].append('g')  # green
-                if (cur_state_g_idx + 1) < num_g_states:
-                    cur_state_g_idx += 1
-            elif row == cur_state_b[0] and col == cur_state_b[1]:
-                # print("Current state_b index :", cur_state_b_idx)
-                maze[row].append('b')  # brown
-                if (cur_state_b_idx + 1) < num_b_states:
-                    cur_state_b_idx += 1
-            elif row == cur_state_w[0] and col == cur_state_w[1]:
-                # print("Current state_w index :", cur_state_w_idx)
-                maze[row].append('w')  # wall
-                if (cur_state_w_idx + 1) < num_w_states:
-                    cur_state_w_idx += 1
-            else:
-                maze[row].append(' ')  # white
-
-    return maze
+    # Start with all white cells and scatter the green, brown and wall states into the maze at once
+    maze = np.full((maze_height, maze_width), ' ', dtype='<U1')
+
+    for states, colour in ((states_g, 'g'), (states_b, 'b'), (states_w, 'w')):
+        rows, cols = zip(*states)
+        maze[list(rows), list(cols)] = colour
+
+    # The MDP indexes the maze as a list of lists, maze[row][col]
+    return maze.tolist()
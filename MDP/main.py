@@ -13,12 +13,15 @@ Implements methods :
 """
 
 # Import common libraries
+import io
 import os
 import pprint
-import copy
+import sys
+
+import matplotlib
 
 # Import the dependency files
-from algorithms import value_iteration, policy_iteration
+from algorithms import value_iteration, policy_iteration, prioritized_sweeping
 from config import *
 from generate_maze import random_maze
 from maze import Maze
@@ -30,20 +33,24 @@ import parse_mdp_args
 # Global pretty print setup with indentation
 pp = pprint.PrettyPrinter(indent=2)
 
+# MDP algorithm options, looked up once
+_VI, _PI, _PS = MDP_ALGORITHM['VI'], MDP_ALGORITHM['PI'], MDP_ALGORITHM['PS']
+
 
 def solve_MDP(grid: list, algo: int, discount_gamma: float = 1.0,
               max_error: float = 1.0, num_policy_evaluation: int = 1,
-              save_filename_prefix=None):
+              save_filename_prefix=None, show_plot: bool = True):
     """
     params:
     - grid (list): maze environment
-    - algo (int): Value Iteration (1) and Policy Iteration (2)
+    - algo (int): Value Iteration (1), Policy Iteration (2) and Prioritized Sweeping (3)
     - discount_gamma (float): discount factor for future state
     - max_error (float): maximum error allowed in the utility of any state
     - num_policy_evaluation (int): number of times to do policy evaluation (k) to obtain
                                    better estimates for the utilities, U_i+1(s) with default value of 1
+    - show_plot (bool): whether to show the plot of utility estimates as well as saving it
 
-    Calls the "Value Iteration" and "Policy Iteration" methods and saves the results
+    Calls the "Value Iteration", "Policy Iteration" and "Prioritized Sweeping" methods and saves the results
     """
 
     # Initialise the MDP, maze environment
@@ -57,7 +64,7 @@ def solve_MDP(grid: list, algo: int, discount_gamma: float = 1.0,
     # δ, the maximum change in the utility of any state in an iteration
     delta = "%.3f" % (max_error * (1 - discount_gamma) / discount_gamma)
 
-    if algo == MDP_ALGORITHM['VI']:
+    if algo == _VI:
         print("MDP : Value Iteration (ε={}, δ={})".format(max_error, delta))
         print("---------------------------------------")
 
@@ -69,9 +76,10 @@ def solve_MDP(grid: list, algo: int, discount_gamma: float = 1.0,
         # 'value_iteration_plot_(δ={}).png'.format(delta)
         plot_utility_vs_iteration(
             result['iteration_utilities'],
-            save_file_name=save_filename_prefix + '_plot_(δ={}).png'.format(delta)
+            save_file_name=save_filename_prefix + '_plot_(δ={}).png'.format(delta),
+            show=show_plot
         )
-    elif algo == MDP_ALGORITHM['PI']:
+    elif algo == _PI:
         print("MDP : Policy Iteration")
         print("----------------------")
 
@@ -83,10 +91,26 @@ def solve_MDP(grid: list, algo: int, discount_gamma: float = 1.0,
         # 'policy_iteration_plot_(npe={}).png'.format(num_policy_evaluation)
         plot_utility_vs_iteration(
             result['iteration_utilities'],
-            save_file_name=save_filename_prefix + '_plot_(npe={}).png'.format(num_policy_evaluation)
+            save_file_name=save_filename_prefix + '_plot_(npe={}).png'.format(num_policy_evaluation),
+            show=show_plot
+        )
+    elif algo == _PS:
+        print("MDP : Prioritized Sweeping (ε={}, δ={})".format(max_error, delta))
+        print("-------------------------------------------")
+
+        result = prioritized_sweeping(maze, max_error=max_error)
+
+        # 'prioritized_sweeping_result_(δ={}).txt'.format(delta)
+        _show_maze_result(maze, result, save_filename_prefix + '_result_(δ={}).txt'.format(delta))
+
+        # 'prioritized_sweeping_plot_(δ={}).png'.format(delta)
+        plot_utility_vs_iteration(
+            result['iteration_utilities'],
+            save_file_name=save_filename_prefix + '_plot_(δ={}).png'.format(delta),
+            show=show_plot
         )
     else:
-        print("Supported MDP algorithm option is only 1 or 2")
+        print("Supported MDP algorithm option is only 1, 2 or 3")
 
 
 def _show_maze_result(maze, result, save_file_name=None):
@@ -96,38 +120,38 @@ def _show_maze_result(maze, result, save_file_name=None):
     - result (dict): result of solving a maze
     - save_file_name (str): file name with directory path to save information; default is None (which is not saved)
     """
-    lines = []
-
-    line = '\nTotal number of iterations : ' + str(result['num_iterations'])
-    print(line)
-    lines.append(line)
-
+    # Bind the results and the symbol of each action to locals once, rather than looking them up for every state
     utilities, optimal_policy = result['utilities'], result['optimal_policy']
+    action_symbols = {action: DIRECTION[action.value] for action in maze.actions}
 
-    # Deep copy constructs a new compound object and recursively inserts copies of the objects from
-    # the original into it.  This retains the original maze and use only the copy for updates.
-    optimal_utility_grid = copy.deepcopy(maze.grid)
-    optimal_policy_grid = copy.deepcopy(maze.grid)
-
-    line = '--- (row, column) : Utility for each state with best action  ---'
-    print(line)
-    lines.append(line)
-
-    for state_position in maze.states:
-        if state_position[1] == 0:
-            print()
-            lines.append(' ')
+    # Copy each row of the maze, a list of lists of single characters, so that the original maze is retained
+    # and only the copies are updated.  A deep copy is not needed as the characters themselves are immutable.
+    optimal_utility_grid = [row[:] for row in maze.grid]
+    optimal_policy_grid = [row[:] for row in maze.grid]
 
+    for row, col in maze.states:
         # Keep ending zero after rounding : "%.2f" % round(utilities[state_position], 2) but it becomes a string
-        optimal_utility_grid[state_position[0]][state_position[1]] = round(utilities[state_position], 2)
-
-        action = optimal_policy[state_position]
-        action_symbol = DIRECTION[action.value]
-        optimal_policy_grid[state_position[0]][state_position[1]] = action_symbol
-
-        line = str(state_position) + ' - utility: {:.2f}; action: {}'.format(utilities[state_position], action_symbol)
-        print(line)
-        lines.append(line)
+        optimal_utility_grid[row][col] = round(utilities[row, col], 2)
+        optimal_policy_grid[row][col] = action_symbols[optimal_policy[row, col]]
+
+    # Format the line of each state once, with whether it starts a row of the maze
+    state_lines = [(col == 0, f'{(row, col)} - utility: {utilities[row, col]:.2f}; '
+                              f'action: {optimal_policy_grid[row][col]}\n')
+                   for row, col in maze.states]
+
+    # Accumulate the lines in a single buffer for each output; each row of the maze starts after a separating
+    # line, which is empty on the console and a single space in the file
+    outputs = []
+    for row_separator in ('\n', ' \n'):
+        buffer = io.StringIO()
+        buffer.write(f'\nTotal number of iterations : {result["num_iterations"]}\n')
+        buffer.write('--- (row, column) : Utility for each state with best action  ---\n')
+        buffer.writelines(f'{row_separator if starts_row else ""}{line}' for starts_row, line in state_lines)
+        outputs.append(buffer.getvalue())
+    console_output, file_output = outputs
+
+    # Write all the lines at once instead of one call for each state
+    sys.stdout.write(console_output)
 
     print('\n--- Optimal utility grid (w = wall) ---')
     pp.pprint(optimal_utility_grid)
@@ -138,9 +162,8 @@ def _show_maze_result(maze, result, save_file_name=None):
 
     if save_file_name is not None:
         # RESULTS_DIR_PATH subdirectory ('./results') has been created
-        with open(save_file_name, 'w') as file:
-            for line in lines:
-                file.write(line + '\n')
+        with open(save_file_name, 'w', encoding='utf-8') as file:
+            file.write(file_output)
             # print(optimal_policy_grid, file)
 
 
@@ -152,6 +175,10 @@ def main():
     # Make sure directory exist for saving results
     os.makedirs(prog_args.datadir, exist_ok=True)
 
+    # Plots that are only saved are rendered with Agg, without starting a GUI backend, unless a backend is chosen
+    if prog_args.no_show and 'MPLBACKEND' not in os.environ:
+        matplotlib.use('Agg')
+
     # Use the pre-defined maze environment (GRID, GRID_C1, GRID_C2, GRID_C3)
     generated_maze = GRID  # default
 
@@ -179,20 +206,29 @@ def main():
                                                                         prog_args.save_filename_prefix,
                                                                         prog_args.datadir))
 
-    if prog_args.algo == MDP_ALGORITHM['VI']:
+    if prog_args.algo == _VI:
         # Solve MDP with Value Iteration (ε, set max_error=0.1)
-        solve_MDP(grid=generated_maze, algo=MDP_ALGORITHM['VI'], discount_gamma=prog_args.discount_gamma,
+        solve_MDP(grid=generated_maze, algo=_VI, discount_gamma=prog_args.discount_gamma,
                   max_error=prog_args.max_error,
-                  save_filename_prefix='./' + prog_args.datadir + '/' + prog_args.save_filename_prefix)
+                  save_filename_prefix='./' + prog_args.datadir + '/' + prog_args.save_filename_prefix,
+                  show_plot=not prog_args.no_show)
 
-    elif prog_args.algo == MDP_ALGORITHM['PI']:
+    elif prog_args.algo == _PI:
         # Solve MDP with Policy Iteration (Standard, set num_pe=1)
-        solve_MDP(grid=generated_maze, algo=MDP_ALGORITHM['PI'], discount_gamma=prog_args.discount_gamma,
+        solve_MDP(grid=generated_maze, algo=_PI, discount_gamma=prog_args.discount_gamma,
                   num_policy_evaluation=prog_args.num_pe,
-                  save_filename_prefix='./' + prog_args.datadir + '/' + prog_args.save_filename_prefix)
+                  save_filename_prefix='./' + prog_args.datadir + '/' + prog_args.save_filename_prefix,
+                  show_plot=not prog_args.no_show)
+
+    elif prog_args.algo == _PS:
+        # Solve MDP with Prioritized Sweeping (ε, set max_error=0.1)
+        solve_MDP(grid=generated_maze, algo=_PS, discount_gamma=prog_args.discount_gamma,
+                  max_error=prog_args.max_error,
+                  save_filename_prefix='./' + prog_args.datadir + '/' + prog_args.save_filename_prefix,
+                  show_plot=not prog_args.no_show)
 
     else:
-          print("Supported MDP algorithm option is only; 1: Value Iteration or 2: Policy Iteration")
+          print("Supported MDP algorithm option is only; 1: Value Iteration, 2: Policy Iteration or 3: Prioritized Sweeping")
 
     print("\n--- Solving MDP with the following maze ---")
     pp.pprint(generated_maze)
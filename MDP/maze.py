@@ -18,26 +18,225 @@ Implements class methods :
 - reward_function
 - get_next_states
 
-Internal method
+Internal methods
+- _grid_codes
+- _blocked_cells
+- _compute_next_states
 - _form_action_next_state_map
+- _form_state_map
+- _form_transition_arrays
 """
 
 import enum
+import functools
+
+import numpy as np
+
 from mdp import MarkovDecisionProcess
 
 
-class MazeAction(enum.Enum):
+class MazeAction(enum.IntEnum):
     """
     Actions that are available in the maze environment.
-    - MazeAction.MOVE_UP.value = 1
-    - MazeAction.MOVE_DOWN.value = 2
-    - MazeAction.MOVE_LEFT.value = 3
-    - MazeAction.MOVE_RIGHT.value = 4
+    Integer values starting from 0, so that an action can index arrays directly.
+    - MazeAction.MOVE_UP.value = 0
+    - MazeAction.MOVE_DOWN.value = 1
+    - MazeAction.MOVE_LEFT.value = 2
+    - MazeAction.MOVE_RIGHT.value = 3
+    """
+    MOVE_UP = 0
+    MOVE_DOWN = 1
+    MOVE_LEFT = 2
+    MOVE_RIGHT = 3
+
+
+# (row, col) offsets of the intended move of each action, followed by the two moves at right angles to it
+ACTION_DELTAS = {
+    MazeAction.MOVE_UP: ((-1, 0), (0, -1), (0, 1)),     # above, left, right
+    MazeAction.MOVE_DOWN: ((1, 0), (0, -1), (0, 1)),    # below, left, right
+    MazeAction.MOVE_LEFT: ((0, -1), (-1, 0), (1, 0)),   # left, above, below
+    MazeAction.MOVE_RIGHT: ((0, 1), (-1, 0), (1, 0)),   # right, above, below
+}
+
+# Probability of the intended move and of each of the moves at right angles to it
+OUTCOME_PROBABILITIES = (0.8, 0.1, 0.1)
+
+# Colours of the cells, the code of each colour is its index: white, green, brown and wall
+CELL_COLOURS = (' ', 'g', 'b', 'w')
+WALL_CODE = CELL_COLOURS.index('w')
+
+
+# Internal method :
+# Convert the colours of the grid once to small integer codes, so that cells are looked up by array indexing
+# rather than by indexing lists of strings and hashing the colours
+def _grid_codes(grid):
+    """
+    params:
+    - grid (list or tuple): maze environment, rows of colours
+
+    return:
+    code of the colour of each cell, its index in CELL_COLOURS (np.ndarray of int8)
+    """
+    colours = np.array(grid)
+    codes = np.full(colours.shape, -1, dtype=np.int8)
+    for code, colour in enumerate(CELL_COLOURS):
+        codes[colours == colour] = code
+
+    # Every cell must be one of the known colours, rather than be treated as any of them
+    if (codes < 0).any():
+        raise ValueError('Unknown colours in the maze: {}'.format(sorted(set(colours[codes < 0].tolist()))))
+
+    return codes
+
+
+# Internal method :
+# Mark the cells that cannot be entered, with a border of blocked cells around the grid so that the neighbour
+# of any cell is checked by indexing alone, without bounds checks
+def _blocked_cells(grid_codes):
+    """
+    params:
+    - grid_codes (np.ndarray): code of the colour of each cell, see _grid_codes
+
+    return:
+    whether cell (row - 1, col - 1) is a wall or outside the grid, for each (row, col) (np.ndarray of bool)
     """
-    MOVE_UP = enum.auto()
-    MOVE_DOWN = enum.auto()
-    MOVE_LEFT = enum.auto()
-    MOVE_RIGHT = enum.auto()
+    is_wall = grid_codes == WALL_CODE
+    blocked = np.ones((is_wall.shape[0] + 2, is_wall.shape[1] + 2), dtype=bool)
+    blocked[1:-1, 1:-1] = is_wall
+    return blocked
+
+
+# Internal method :
+# Work out the next states of the given state and action, adjusted for walls and grid boundary
+def _compute_next_states(blocked, state, action: MazeAction):
+    """
+    params:
+    - blocked (np.ndarray): walls and the border around the grid, see _blocked_cells
+    - state (tuple): row, col position
+    - action (MazeAction): possible actions can be taken at the given state
+
+    return:
+    - dictionary keys are the actual next state positions, the intended and the two unintended moves
+    - adjusted to legitimate positions (remain outside wall, within grid).  Moves that end in the same
+    - position have their probabilities added, so there are at most 3 keys.
+    {
+        actual_next_state (tuple): 0.8 (float),
+        actual_unintended_next_state_1 (tuple): 0.1 (float),
+        actual_unintended_next_state_2 (tuple): 0.1 (float)
+    }
+    """
+    next_states = {}
+
+    # The intended move first, then the two moves at right angles to it
+    for (row_delta, col_delta), probability in zip(ACTION_DELTAS[action], OUTCOME_PROBABILITIES):
+        intended_state = (state[0] + row_delta, state[1] + col_delta)
+
+        # For invalid state (wall or outside grid), agent remains in the same spot
+        actual_state = state if blocked[intended_state[0] + 1, intended_state[1] + 1] else intended_state
+
+        next_states[actual_state] = next_states.get(actual_state, 0.0) + probability
+
+    return next_states
+
+
+# Internal method :
+# For all possible actions, initialise all possible states with respective next steps with uncertainties
+def _form_action_next_state_map(blocked, state, actions):
+    """
+    params:
+    - blocked (np.ndarray): walls and the border around the grid, see _blocked_cells
+    - state (tuple): row, col position
+    - actions (tuple): possible actions can be taken at the given state
+
+    return:
+    - For each possible action, return the next states with respective probabilities, as a tuple indexed
+    - by the integer value of the action (actions are in MazeAction order), without hashing the action
+    (
+        {   # MazeAction.MOVE_UP, 0
+            actual_next_state (tuple): probability (float),
+            ...
+        },
+
+        { ... MazeAction.MOVE_DOWN, 1, similar format as MazeAction.MOVE_UP... },
+        { ... MazeAction.MOVE_LEFT, 2, similar format as MazeAction.MOVE_UP... },
+        { ... MazeAction.MOVE_RIGHT, 3, similar format as MazeAction.MOVE_UP... }
+    )
+    """
+    return tuple(_compute_next_states(blocked, state, action) for action in actions)
+
+
+# Internal method :
+# Build the next states of every non-wall state for every action, in a single pass
+# Like the transition arrays, the map depends only on the layout of the grid, so mazes with the same grid share it
+@functools.lru_cache(maxsize=16)
+def _form_state_map(grid: tuple, actions: tuple):
+    """
+    params:
+    - grid (tuple): maze environment as a tuple of rows, each a tuple of colours
+    - actions (tuple): possible actions can be taken at any state
+
+    return:
+    {
+        (row, col): next states of each action, see _form_action_next_state_map (tuple)
+    }
+    """
+    # Walls and the border around the grid, see _blocked_cells
+    blocked = _blocked_cells(_grid_codes(grid))
+
+    return {
+        (row, col): _form_action_next_state_map(blocked, (row, col), actions)
+        for row in range(len(grid))
+        for col in range(len(grid[0]))
+        if not blocked[row + 1, col + 1]  # non-wall states
+    }
+
+
+# Internal method :
+# Build P(s'|s, a) for all cells at once as Structure-of-Arrays, for the solvers to sweep without dictionaries
+# The transitions depend only on the layout of the grid, so mazes with the same grid (eg. solved with different
+# discount factors) share the same read-only arrays
+@functools.lru_cache(maxsize=16)
+def _form_transition_arrays(grid: tuple, actions: tuple):
+    """
+    Cells are indexed by row * width + col.  A move out of the grid or into a wall leaves the agent in
+    the same cell, and a wall cell stays where it is under every action.
+
+    params:
+    - grid (tuple): maze environment as a tuple of rows, each a tuple of colours
+    - actions (tuple): possible actions can be taken at any state
+
+    return:
+    (
+        index of the actual next cell of each action (row), cell and outcome (np.ndarray of int32),
+        probability of each action (row), cell and outcome (np.ndarray of float32)
+    )
+    """
+    height, width = len(grid), len(grid[0])
+    rows, cols = np.indices((height, width))
+    cells = rows * width + cols
+    blocked = _blocked_cells(_grid_codes(grid))
+    is_wall = blocked[1:-1, 1:-1]
+
+    next_state_indices = np.empty((len(actions), height * width, len(OUTCOME_PROBABILITIES)), dtype=np.int32)
+
+    for a, action in enumerate(actions):
+        for k, (row_delta, col_delta) in enumerate(ACTION_DELTAS[action]):
+            # Whether the neighbour in this direction is blocked, for every cell at once
+            neighbour_blocked = blocked[1 + row_delta:1 + row_delta + height, 1 + col_delta:1 + col_delta + width]
+
+            # Wall cells never move; walls and the grid boundary bounce the agent back to where it is
+            moves = ~(is_wall | neighbour_blocked)
+            next_cells = cells + row_delta * width + col_delta
+            next_state_indices[a, :, k] = np.where(moves, next_cells, cells).ravel()
+
+    transition_probabilities = np.broadcast_to(np.array(OUTCOME_PROBABILITIES, dtype=np.float32),
+                                               next_state_indices.shape).copy()
+
+    # Shared by every maze with the same grid, so they must not be changed
+    next_state_indices.flags.writeable = False
+    transition_probabilities.flags.writeable = False
+
+    return next_state_indices, transition_probabilities
 
 # Derived class from base class, MarkovDecisionProcess
 class Maze(MarkovDecisionProcess):
@@ -48,27 +247,34 @@ class Maze(MarkovDecisionProcess):
     - 'b': brown, reward = -1
     - 'w': wall (if agent moves into a wall, it will stays put at the current state)
     """
+    __slots__ = ('grid', 'grid_codes', 'reward_mapping', 'starting_point', 'height', 'width',
+                 'state_ids', 'rewards', 'next_state_indices', 'transition_probabilities')
+
     # Initialisation with specific order
     def __init__(self, grid, reward_mapping, starting_point, discount_gamma):
         """
         Initialises:
         - states: {
-            (row, col): {
-                action_1 (MazeAction): {
+            (row, col): (
+                {   # action_1, indexed by MazeAction.MOVE_UP (0)
                     next_state_1 (tuple): probability,
                     next_state_2 (tuple): probability,
                     next_state_3 (tuple): probability
                 },
                 ...,
-                action_4: {
+                {   # action_4, indexed by MazeAction.MOVE_RIGHT (3)
                     next_state_1 (tuple): probability,
                     next_state_2 (tuple): probability,
                     next_state_3 (tuple): probability,
                 }
-            }
+            )
         }
         - actions: list of available actions
         - discount (the future individual state, 0 < γ < 1)
+        - grid_codes: code of the colour of each (row, col) cell, see _grid_codes (np.ndarray of int8)
+        - state_ids: { (row, col): integer id of the state, row * width + col }, the index into the arrays
+        - rewards: R(s) of each integer id, exactly as in reward_mapping (np.ndarray of float64)
+        - next_state_indices, transition_probabilities: the same transitions as arrays, see _form_transition_arrays
         """
         self.grid = grid
         self.reward_mapping = reward_mapping
@@ -77,14 +283,10 @@ class Maze(MarkovDecisionProcess):
         self.height = len(grid)    # row
         self.width = len(grid[0])  # col
 
-        possible_states = {
-            (row, col): {}
-            for row in range(self.height)
-            for col in range(self.width)
-            if grid[row][col] != 'w'  # non-wall states
-        }
+        # Colours of the grid as integer codes, see _grid_codes
+        self.grid_codes = _grid_codes(grid)
 
-        # All possible actions for any non-wall states
+        # All possible actions for any non-wall states, in MazeAction order so that each indexes its next states
         possible_actions = [
             MazeAction.MOVE_UP,
             MazeAction.MOVE_DOWN,
@@ -92,50 +294,29 @@ class Maze(MarkovDecisionProcess):
             MazeAction.MOVE_RIGHT
         ]
 
-        # Initialise class object
-        super().__init__(possible_states, possible_actions, discount_gamma)
-
-        # For all possible state positions, get the next state
-        for state_position in possible_states:
-            possible_states[state_position] = \
-                self._form_action_next_state_map(state_position, possible_actions)
+        # The state map and the transition arrays are cached by the layout of the grid, see _form_state_map and
+        # _form_transition_arrays; they are shared with every maze of the same layout, so they must not be changed
+        grid_layout, action_layout = tuple(map(tuple, grid)), tuple(possible_actions)
 
+        # For all possible state positions, get the next state, see _form_state_map
+        possible_states = _form_state_map(grid_layout, action_layout)
 
-    # Internal method :
-    # For all possible actions, initialise all possible states with respective next steps with uncertainties
-    def _form_action_next_state_map(self, state, actions):
-        """
-        params:
-        - state (tuple): row, col position
-        - actions (list): possible actions can be taken at the given state
+        # Initialise class object
+        super().__init__(possible_states, possible_actions, discount_gamma)
 
-        return:
-        - For each possible action, return the next states with respective probabilities
-        {
-            <MazeAction.MOVE_UP: 1>: {
-                intended_next_state (tuple): {
-                    'actual': actual_next_state (tuple),
-                    'probability': 0.8 (float)
-                },
-                unintended_next_state_1 (tuple): {
-                    'actual': unintended_next_state_1 (tuple),
-                    'probability': 0.1 (float)
-                },
-                unintended_next_state_2 (tuple): {
-                    'actual': unintended_next_state_2 (tuple),
-                    'probability': 0.1 (float)
-                },
-            }
+        # Integer ids of the states; (row, col) positions are kept only to report and plot the results
+        self.state_ids = {(row, col): row * self.width + col for row, col in possible_states}
 
-            <MazeAction.MOVE_DOWN: 2>: { ... similar format as MazeAction.MOVE_UP... },
-            <MazeAction.MOVE_LEFT: 3>: { ... similar format as MazeAction.MOVE_UP... },
-            <MazeAction.MOVE_RIGHT: 4>: {... similar format as MazeAction.MOVE_UP... }
-        }
-        """
-        return {
-            action: self.get_next_states(state, action)
-            for action in actions
-        }
+        # R(s) of each state by its integer id, looked up from the code of its colour; walls have no reward
+        # Kept in double precision so that reward_function returns the rewards exactly; the solvers take their own
+        # single precision copy
+        # Only the colours in the grid need a reward in reward_mapping
+        rewards_by_code = np.zeros(len(CELL_COLOURS), dtype=np.float64)
+        for code in np.unique(self.grid_codes):
+            if code != WALL_CODE:
+                rewards_by_code[code] = reward_mapping[CELL_COLOURS[code]]
+        self.rewards = rewards_by_code[self.grid_codes].ravel()
+        self.next_state_indices, self.transition_probabilities = _form_transition_arrays(grid_layout, action_layout)
 
 
     def get_next_states(self, state, action: MazeAction):
@@ -145,197 +326,10 @@ class Maze(MarkovDecisionProcess):
         - action (MazeAction): possible actions can be taken at the given state
 
         return:
-        - dictionary keys (intended_next_state, unintended_next_state_1, unintended_next_state_2) are the
-        - next state positions which are adjusted to actual legitimate positions (remain outside wall, within grid)
-        {
-            intended_next_state (tuple): {
-                'actual': actual_next_state (tuple),
-                'probability': 0.8 (float)
-            },
-            unintended_next_state_1 (tuple): {
-                'actual': unintended_next_state_1 (tuple),
-                'probability': 0.1 (float)
-            },
-            unintended_next_state_2 (tuple): {
-                'actual': unintended_next_state_2 (tuple),
-                'probability': 0.1 (float)
-            },
-        }
+        - the next states with respective probabilities, as computed once by _compute_next_states
+          for the layout of the grid (the maze does not change, so the result is reused)
         """
-        if action is MazeAction.MOVE_UP:
-            # Find the above state (row-1, col)
-            above_state = (state[0] - 1, state[1])
-
-            if above_state in self.states:
-                actual_above_state = above_state 
-            else:
-                # For invalid state (wall or outside grid), agent remains in the same spot
-                actual_above_state = state
-
-            # Find the left state (row, col-1)
-            left_state = (state[0], state[1] - 1)
-
-            if left_state in self.states:
-                actual_left_state = left_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_left_state = state
-
-            # Find the right state (row, col+1)
-            right_state = (state[0], state[1] + 1)
-
-            if right_state in self.states:
-                actual_right_state = right_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_right_state = state
-
-            next_states = { 
-                above_state: {
-                    'actual': actual_above_state,
-                    'probability': 0.8,
-                }, 
-                left_state: {
-                    'actual': actual_left_state,
-                    'probability': 0.1,
-                }, 
-                right_state: {
-                    'actual': actual_right_state,
-                    'probability': 0.1,
-                }
-            }
-
-        elif action is MazeAction.MOVE_DOWN:
-            # Find the below state (row+1, col)
-            below_state = (state[0] + 1, state[1])
-            
-            if below_state in self.states:
-                actual_below_state = below_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_below_state = state
-
-            # Find the left state (row, col-1)
-            left_state = (state[0], state[1] - 1)
-            
-            if left_state in self.states:
-                actual_left_state = left_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_left_state = state
-
-            # Find the right state (row, col+1)
-            right_state = (state[0], state[1] + 1)
-
-            if right_state in self.states:
-                actual_right_state = right_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_right_state = state
-
-            next_states = {
-                below_state: {
-                    'actual': actual_below_state,
-                    'probability': 0.8,
-                }, 
-                left_state: {
-                    'actual': actual_left_state,
-                    'probability': 0.1,
-                }, 
-                right_state: {
-                    'actual': actual_right_state,
-                    'probability': 0.1,
-                }
-            }
-
-        elif action is MazeAction.MOVE_LEFT:
-            # Find the left state (row, col-1)
-            left_state = (state[0], state[1] - 1)
-            
-            if left_state in self.states:
-                actual_left_state = left_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_left_state = state
-
-            # Find the above state (row-1, col)
-            above_state = (state[0] - 1, state[1])
-
-            if above_state in self.states:
-                actual_above_state = above_state
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_above_state = state
-
-            # Find the below state (row+1, col)
-            below_state = (state[0] + 1, state[1])
-
-            if below_state in self.states:
-                actual_below_state = below_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_below_state = state
-
-            next_states = {
-                left_state: {
-                    'actual': actual_left_state,
-                    'probability': 0.8,
-                },
-                above_state: {
-                    'actual': actual_above_state,
-                    'probability': 0.1,
-                }, 
-                below_state: {
-                    'actual': actual_below_state,
-                    'probability': 0.1,
-                }
-            }
-
-        else:  # action is MazeAction.MOVE_RIGHT
-
-            # Find the right state (row, col+1)
-            right_state = (state[0], state[1] + 1)
-
-            if right_state in self.states:
-                actual_right_state = right_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_right_state = state
-
-            # Find the above state (row-1, col)
-            above_state = (state[0] - 1, state[1])
-
-            if above_state in self.states:
-                actual_above_state = above_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_above_state = state
-
-            # Find the below state (row+1, col)
-            below_state = (state[0] + 1, state[1])
-
-            if below_state in self.states:
-                actual_below_state = below_state 
-            else:
-                # For invalid state, agent remains in the same spot
-                actual_below_state = state
-
-            next_states = {
-                right_state: {
-                    'actual': actual_right_state,
-                    'probability': 0.8,
-                },
-                above_state: {
-                    'actual': actual_above_state,
-                    'probability': 0.1,
-                }, 
-                below_state: {
-                    'actual': actual_below_state,
-                    'probability': 0.1,
-                }
-            }
-
-        return next_states
+        return self.states[state][action]
 
 
     def transition_model(self, state, action, next_state) -> float:
@@ -343,20 +337,15 @@ class Maze(MarkovDecisionProcess):
         params
         - state (tuple): row, col position
         - action (MazeAction): take this action at this given state
-        - next_state (tuple): intended row, col position
+        - next_state (tuple): actual row, col position
 
         return:
         probability of the action going to next state from current state
         """
-
-        # Assumes calling method provides value next state (ie key for retrieving the probability)
-        # Actual state has been corrected in get_next_states for invalid cases (out of grid or going into wall)
-        # Obtain next state based on action
-        next_states_with_action = self.states[state][action]
-
+        # Actual states have been corrected in get_next_states for invalid cases (out of grid or going into wall)
         # If key not found returns default value of 0
         # Returns probability of the selected action going to next state, which ranges from 0 to 1, inclusive (float)
-        return next_states_with_action.get(next_state, 0)['probability']
+        return self.states[state][action].get(next_state, 0.0)
 
 
     def reward_function(self, state):
@@ -367,6 +356,5 @@ class Maze(MarkovDecisionProcess):
         return:
         reward value (float) based on the colour
         """
-        # Access list to retrieve colour from grid and used as key for reward_mapping
-        colour = self.grid[state[0]][state[1]]
-        return self.reward_mapping[colour]
+        # Colour of the state in the grid used as key for reward_mapping, computed once at initialisation
+        return float(self.rewards[self.state_ids[state]])
@@ -20,6 +20,9 @@ class MarkovDecisionProcess:
     Markov property - Transition properties depend only on the current state, not on
     previous history (how that state was reached)
     """
+    # Fixed set of attributes, without a per-instance __dict__
+    __slots__ = ('states', 'actions', 'discount')
+
     def __init__(self, states, actions, discount):
         """
         Initialise states, actions and discount.
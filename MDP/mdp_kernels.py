@@ -0,0 +1,257 @@
+#######################################################################################################
+# This file implements the compiled Bellman backups used by the algorithms to solve the MDP
+# - U′(s) ← R(s) + γ max a∈A(s) ∑s′ P(s′|s,a) U(s′), for a sweep of states
+# - U_i+1(s) ← R(s) + γ ∑s′ P(s'|s, π_i(s)) U_i(s'), for a fixed policy
+# - Prioritized Sweeping, one state at a time in order of the largest pending change in utility
+#
+# Filename    : mdp_kernels.py
+#######################################################################################################
+"""
+Implements the Numba kernels over the Structure-of-Arrays transitions of the maze.
+
+Public methods :
+- make_kernels
+
+Internal methods :
+- _comes_before
+- _sift_up
+- _sift_down
+"""
+
+import functools
+
+import numba
+import numpy as np
+
+
+# Utilities are bounded by max|R|/(1−γ) and compared against ϵ(1−γ)/γ, so single precision is enough
+# and halves the memory moved by every sweep
+UTILITY_DTYPE = np.float32
+
+
+# Prioritized Sweeping keeps every state in a binary max-heap of states ordered by priority, with the position
+# of each state in the heap, so that a changed priority is moved up or down in place instead of pushed again
+@numba.njit(cache=True)
+def _comes_before(priorities, s, other):
+    """
+    params:
+    - priorities (np.ndarray): pending change in the utility of each state
+    - s, other (int): indices of the two states to compare
+
+    return:
+    True if s has the larger priority, or the same priority and the smaller index (bool)
+    """
+    return priorities[s] > priorities[other] or (priorities[s] == priorities[other] and s < other)
+
+
+@numba.njit(cache=True)
+def _sift_up(heap, heap_positions, priorities, i):
+    """
+    Move the state at position i of the heap up, after its priority has increased
+
+    params:
+    - heap (np.ndarray): states in heap order, the state with the largest priority first
+    - heap_positions (np.ndarray): position of each state in the heap, updated with the heap
+    - priorities (np.ndarray): pending change in the utility of each state
+    - i (int): position of the state in the heap
+    """
+    s = heap[i]
+    while i > 0:
+        parent = (i - 1) // 2
+        if not _comes_before(priorities, s, heap[parent]):
+            break
+        heap[i] = heap[parent]
+        heap_positions[heap[i]] = i
+        i = parent
+
+    heap[i] = s
+    heap_positions[s] = i
+
+
+@numba.njit(cache=True)
+def _sift_down(heap, heap_positions, priorities, i):
+    """
+    Move the state at position i of the heap down, after its priority has decreased
+
+    params:
+    - heap, heap_positions, priorities (np.ndarray): as for _sift_up
+    - i (int): position of the state in the heap
+    """
+    s = heap[i]
+    while True:
+        child = 2 * i + 1
+        if child >= len(heap):
+            break
+        if child + 1 < len(heap) and _comes_before(priorities, heap[child + 1], heap[child]):
+            child += 1
+        if not _comes_before(priorities, heap[child], s):
+            break
+        heap[i] = heap[child]
+        heap_positions[heap[i]] = i
+        i = child
+
+    heap[i] = s
+    heap_positions[s] = i
+
+
+@functools.lru_cache(maxsize=None)
+def make_kernels(num_actions: int, num_successors: int):
+    """
+    Compile the Bellman backups for one shape of MDP, with the number of actions and successors
+    of each state baked in as constants so that the loops over them can be unrolled.
+    The kernels are compiled once for each shape and reused by every solve of the same shape, and
+    are cached on disk so that later runs skip the compilation.
+
+    Numba keys the on-disk cache of a closure on the values it captures, so the kernels capture only
+    these two integers.  They must not call one another : a captured compiled function never compares
+    equal across runs, and the caller would be recompiled by every run.  Compiled helpers they share
+    are found as globals instead, as _sift_up and _sift_down are.
+
+    params:
+    - num_actions (int): number of actions, |A|
+    - num_successors (int): number of next states of each state and action, K
+
+    return:
+    (
+        bellman_backup (compiled function),
+        policy_backup (compiled function),
+        prioritized_sweep (compiled function)
+    )
+    """
+    @numba.njit(cache=True, fastmath=True)
+    def bellman_backup(next_states, probabilities, rewards, utilities, discount, active_states, policy_indices,
+                       expected_utilities):
+        """
+        Implementation of U[s] ← R(s) + γ max a∈A(s) ∑s′P(s′|s, a)U[s′], updated in place
+
+        Gauss–Seidel sweep: states later in the sweep already read the updated utilities of earlier states,
+        which converges in fewer sweeps than updating from a separate copy of U.  The states are therefore
+        visited in order rather than in parallel.
+
+        params:
+        - next_states (np.ndarray): index of each next state s′, for each action, state and successor
+        - probabilities (np.ndarray): P(s′|s, a) of each next state s′, for each action, state and successor
+        - rewards (np.ndarray): reward for each state, R(s)
+        - utilities (np.ndarray): utility value of each state, U, updated in place
+        - discount (float): discount factor, γ
+        - active_states (np.ndarray): indices of the states to update, in sweep order
+        - policy_indices (np.ndarray): output for the index of the best action to take at each state
+        - expected_utilities (np.ndarray): workspace of |A| values for the expected utility of each action
+
+        return:
+        maximum change in the utility of any state in this sweep, δ (float)
+        """
+        max_utility_change = UTILITY_DTYPE(0.0)
+
+        for s in active_states:
+            # ∑s′ P(s′|s, a)U[s′] for every action, a, computed before comparing them so that the
+            # maximum is taken without a data-dependent branch inside the accumulation loop
+            for a in range(num_actions):
+                expected_utility = UTILITY_DTYPE(0.0)
+                for k in range(num_successors):
+                    expected_utility += probabilities[a, s, k] * utilities[next_states[a, s, k]]
+                expected_utilities[a] = expected_utility
+
+            # Get the maximum Expected Utility with the best action for the state (first action on ties)
+            best_action = np.argmax(expected_utilities)
+            new_utility = rewards[s] + discount * expected_utilities[best_action]
+
+            # if |U′[s]−U[s]| > δ then δ ← |U′[s]−U[s]|
+            max_utility_change = max(max_utility_change, abs(new_utility - utilities[s]))
+
+            utilities[s] = new_utility
+            policy_indices[s] = best_action
+
+        return max_utility_change
+
+    @numba.njit(cache=True, parallel=True, fastmath=True)
+    def policy_backup(next_states, probabilities, rewards, utilities, discount, active_states, policy, new_utilities):
+        """
+        Implementation of U_i+1(s) ← R(s) + γ ∑s′ P(s'|s, π_i(s)) U_i(s'), run in parallel over states
+
+        params:
+        - next_states, probabilities (np.ndarray): P(s′|s, a), as for bellman_backup
+        - rewards (np.ndarray): reward for each state, R(s)
+        - utilities (np.ndarray): current utility value of each state, U_i
+        - discount (float): discount factor, γ
+        - active_states (np.ndarray): indices of the states to update
+        - policy (np.ndarray): index of the action to take at each state, π_i
+        - new_utilities (np.ndarray): output for the updated utility value of each state, U_i+1
+        """
+        for i in numba.prange(len(active_states)):
+            s = active_states[i]
+            a = policy[s]
+            expected_utility = UTILITY_DTYPE(0.0)
+            for k in range(num_successors):
+                expected_utility += probabilities[a, s, k] * utilities[next_states[a, s, k]]
+
+            new_utilities[s] = rewards[s] + discount * expected_utility
+
+    @numba.njit(cache=True, fastmath=True)
+    def prioritized_sweep(next_states, probabilities, rewards, utilities, discount, predecessor_offsets,
+                          predecessors, priorities, heap, heap_positions, max_change_allowed, max_updates,
+                          expected_utilities):
+        """
+        Implementation of U[s] ← R(s) + γ max a∈A(s) ∑s′P(s′|s, a)U[s′] for the state with the largest pending
+        change in utility, one state at a time, followed by the pending changes of its predecessors
+
+        params:
+        - next_states, probabilities (np.ndarray): P(s′|s, a), as for bellman_backup
+        - rewards (np.ndarray): reward for each state, R(s)
+        - utilities (np.ndarray): utility value of each state, U, updated in place
+        - discount (float): discount factor, γ
+        - predecessor_offsets (np.ndarray): predecessors of state s′ are predecessors[offsets[s′]:offsets[s′ + 1]]
+        - predecessors (np.ndarray): indices of the states s with P(s′|s, a) > 0, grouped by s′
+        - priorities (np.ndarray): pending change in the utility of each state, |U′[s]−U[s]|, updated in place
+        - heap, heap_positions (np.ndarray): the states as a max-heap of priorities, as for _sift_up, updated in place
+        - max_change_allowed (float): termination threshold, ϵ(1−γ)/γ
+        - max_updates (int): number of state updates after which to return, so that the caller can record U
+        - expected_utilities (np.ndarray): workspace of |A| values, as for bellman_backup
+
+        return:
+        number of states updated, less than max_updates once the largest pending change δ < ϵ(1−γ)/γ (int)
+        """
+        num_updates = 0
+
+        while num_updates < max_updates:
+            s = heap[0]
+
+            # Repeat until the largest pending change δ < ϵ(1−γ)/γ
+            if priorities[s] < max_change_allowed:
+                break
+
+            # U[s] ← R(s) + γ max a∈A(s) ∑s′ P(s′|s, a)U[s′]
+            for a in range(num_actions):
+                expected_utility = UTILITY_DTYPE(0.0)
+                for k in range(num_successors):
+                    expected_utility += probabilities[a, s, k] * utilities[next_states[a, s, k]]
+                expected_utilities[a] = expected_utility
+
+            utilities[s] = rewards[s] + discount * np.max(expected_utilities)
+            priorities[s] = 0.0
+            _sift_down(heap, heap_positions, priorities, 0)
+            num_updates += 1
+
+            # Only the predecessors of s (possibly s itself) have a different pending change now
+            for i in range(predecessor_offsets[s], predecessor_offsets[s + 1]):
+                predecessor = predecessors[i]
+                for a in range(num_actions):
+                    expected_utility = UTILITY_DTYPE(0.0)
+                    for k in range(num_successors):
+                        expected_utility += (probabilities[a, predecessor, k]
+                                             * utilities[next_states[a, predecessor, k]])
+                    expected_utilities[a] = expected_utility
+
+                new_utility = rewards[predecessor] + discount * np.max(expected_utilities)
+                priority = abs(new_utility - utilities[predecessor])
+                previous_priority = priorities[predecessor]
+                priorities[predecessor] = priority
+
+                if priority > previous_priority:
+                    _sift_up(heap, heap_positions, priorities, heap_positions[predecessor])
+                elif priority < previous_priority:
+                    _sift_down(heap, heap_positions, priorities, heap_positions[predecessor])
+
+        return num_updates
+
+    return bellman_backup, policy_backup, prioritized_sweep
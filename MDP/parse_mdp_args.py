@@ -10,6 +10,7 @@ Parsing the parameters from the command line with following formats and examples
 python3 main.py --algo=<ALGO> --discount_gamma=<DISCOUNT_GAMMA>
                 --max_error=<MAX_ERROR> --num_pe=<NUM_PE>
                 --save_filename_prefix=<SAVE_FILENAME_PREFIX> --datadir=<DATADIR>
+                --no_show
                 --gen_maze
                 --num_g_states <NUM_G_STATES> —num_b_states <NUM_B_STATES>
                 --num_w_states <NUM_W_STATES> --maze_width <MAZE_WIDTH>
@@ -20,17 +21,19 @@ Implements method :
 
 import argparse
 
-from config import *
-
 
 # Set training parameters
 def arg_parse():
+    # Only the defaults are needed from config, and only when the arguments are parsed
+    from config import (MDP_ALGORITHM, DISCOUNT_FACTOR, MAX_ERROR, NUM_POLICY_EVALUATION,
+                        RESULTS_DIR_PATH, MAZE_MAPPING)
+
     print("Attempt to parse arguments...")
     parser = argparse.ArgumentParser(description='Assignment 1 : Agent Decision Making project arguments.')
 
     # Add parsing arguments for Value Iteration and Policy Iteration
     parser.add_argument('--algo', dest='algo', type=int,
-                        help='1: Value Iteration; 2: Policy Iteration.')
+                        help='1: Value Iteration; 2: Policy Iteration; 3: Prioritized Sweeping.')
     parser.add_argument('--discount_gamma', dest='discount_gamma', type=float,
                         help='Discount factor for future state.')
     parser.add_argument('--max_error', dest='max_error', type=float,
@@ -41,6 +44,8 @@ def arg_parse():
                         help='Prefix for filename to be saved.')
     parser.add_argument('--datadir', dest='datadir', type=str,
                         help='Directory where results are stored.')
+    parser.add_argument('--no_show', dest='no_show', action='store_const',
+                        const=True, default=False, help='Save the plot without showing it.')
 
     # Add parsing arguments for generating maze with parameters
     # For constant, no value assignment is required for "--gen_maze", just check if exist in command line parameter
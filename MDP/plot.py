@@ -12,28 +12,58 @@ Implements method :
 """
 
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 
 
-def plot_utility_vs_iteration(iteration_utilities, save_file_name=None):
+# Larger mazes are plotted without a legend, as its entries would no longer fit or be told apart by colour
+_MAX_LEGEND_ENTRIES = 50
+
+
+def plot_utility_vs_iteration(iteration_utilities, save_file_name=None, show=True):
     """
     params:
     - iteration_utilities: {
         (row, col): [utility for each iteration (float)]
     }
     - save_file_name (str): file name with directory path to save plot; default is None (which is not saved)
+    - show (bool): whether to show the plot in a window, which blocks until it is closed; default is True
+
+    return:
+    the plotted figure, closed so that its memory is released once it is no longer referenced (Figure)
     """
-    plt.figure(figsize=(16, 8))
+    fig, ax = plt.subplots(figsize=(16, 8))
+
+    # One (iteration, utility) line for each state, drawn together as a single collection
+    utilities = np.array(list(iteration_utilities.values()))
+    num_states, num_iterations = utilities.shape
+    iterations = np.broadcast_to(np.arange(num_iterations), utilities.shape)
+    segments = np.stack((iterations, utilities), axis=-1)
 
-    for state_position in iteration_utilities:
-        plt.plot(iteration_utilities[state_position])
+    # Colour the states in turn with the default colour cycle, as separate ax.plot calls would
+    cycle_colours = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colours = [cycle_colours[i % len(cycle_colours)] for i in range(num_states)]
 
-    plt.legend(iteration_utilities, loc='center left', bbox_to_anchor=(1, 0.5))
+    ax.add_collection(LineCollection(segments, colors=colours))
+    ax.autoscale()
 
-    plt.title('Estimated utility of each state in each iteration')
-    plt.xlabel('Number of iterations')
-    plt.ylabel('Utility estimates')
+    # The collection has no entry for each line, so the legend is keyed with a plain line of each colour
+    if num_states <= _MAX_LEGEND_ENTRIES:
+        labels = [str(state_position) for state_position in iteration_utilities]
+        ax.legend([Line2D([], [], color=colour) for colour in colours], labels,
+                  loc='center left', bbox_to_anchor=(1, 0.5))
+
+    ax.set_title('Estimated utility of each state in each iteration')
+    ax.set_xlabel('Number of iterations')
+    ax.set_ylabel('Utility estimates')
 
     if save_file_name is not None:
-        plt.savefig(save_file_name)
+        fig.savefig(save_file_name, bbox_inches='tight')
+
+    if show:
+        plt.show()
+
+    plt.close(fig)
 
-    plt.show()
+    return fig